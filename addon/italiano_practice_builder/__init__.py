@@ -2,12 +2,15 @@
 
 from __future__ import annotations
 
-import json
-from pathlib import Path
-from typing import Any, Dict, List, Set
+from typing import TYPE_CHECKING, Any, Dict, List, Set
 
+# Only what the menu wiring needs is imported at Anki startup; everything the
+# rebuild uses is imported on first click.
 from aqt import mw
-from aqt.qt import QAction, QMessageBox
+from aqt.qt import QAction
+
+if TYPE_CHECKING:
+    from pathlib import Path
 
 
 ADDON_NAME = "Italiano Practice Builder"
@@ -19,6 +22,8 @@ def _addon_config() -> Dict[str, Any]:
 
 
 def _ensure_repo_path() -> Path:
+    from pathlib import Path
+
     root_str = str(_addon_config().get("root", "")).strip()
     if not root_str:
         raise RuntimeError("Configure add-on: set 'root' to your repo path.")
@@ -32,7 +37,11 @@ def _load_specs(root: Path) -> List[Dict[str, Any]]:
     spec_path = root / "filtered_decks.json"
     if not spec_path.exists():
         raise RuntimeError(f"Spec file not found: {spec_path}")
-    data = json.loads(spec_path.read_text(encoding="utf-8"))
+    try:
+        from orjson import loads
+    except ImportError:
+        from json import loads
+    data = loads(spec_path.read_bytes())
     if not isinstance(data, list):
         raise RuntimeError("filtered_decks.json must contain a list")
     return data
@@ -57,14 +66,31 @@ def _parse_order(value: Any) -> int:
     return 0
 
 
-def _create_or_update_filtered_deck(spec: Dict[str, Any]) -> None:
+def _deck_ids() -> Dict[str, int]:
+    decks = mw.col.decks
+    if hasattr(decks, "all_names_and_ids"):
+        return {d.name: d.id for d in decks.all_names_and_ids()}
+    if hasattr(decks, "all_names"):
+        return {n: decks.id(n) for n in decks.all_names()}
+    return {}
+
+
+def _deck_id(name: str, name_to_did: Dict[str, int]) -> int:
+    did = name_to_did.get(name)
+    if did is None:
+        did = mw.col.decks.id(name)
+        name_to_did[name] = did
+    return did
+
+
+def _create_or_update_filtered_deck(spec: Dict[str, Any], name_to_did: Dict[str, int]) -> int:
     deck_name = str(spec["deck"])
     search = str(spec["search"])
     limit = _parse_limit(spec.get("limit", 50))
     order = _parse_order(spec.get("order", 0))
     reschedule = bool(spec.get("reschedule", False))
 
-    did = mw.col.decks.id(deck_name)
+    did = _deck_id(deck_name, name_to_did)
     conf = mw.col.decks.get(did)
 
     conf["dyn"] = 1
@@ -72,8 +98,10 @@ def _create_or_update_filtered_deck(spec: Dict[str, Any]) -> None:
     conf["resched"] = reschedule
 
     mw.col.decks.save(conf)
+    return did
 
-    # IMPORTANT: force rebuild synchronously
+
+def _rebuild_filtered_deck(did: int) -> None:
     try:
         mw.col.sched.rebuild_filtered_deck(did)
     except AttributeError:
@@ -83,47 +111,49 @@ def _create_or_update_filtered_deck(spec: Dict[str, Any]) -> None:
             pass
 
 
-def _existing_practice_decks() -> Set[str]:
-    decks = mw.col.decks
-    if hasattr(decks, "all_names_and_ids"):
-        return {
-            d.name
-            for d in decks.all_names_and_ids()
-            if d.name.startswith(PRACTICE_PREFIX)
-        }
-    if hasattr(decks, "all_names"):
-        return {
-            n for n in decks.all_names() if n.startswith(PRACTICE_PREFIX)
-        }
-    return set()
-
-
-def _delete_obsolete(desired: Set[str]) -> None:
-    existing = _existing_practice_decks()
-    obsolete = existing - desired
-    for name in obsolete:
-        did = mw.col.decks.id(name)
-        if hasattr(mw.col.decks, "remove"):
-            mw.col.decks.remove([did])
-        else:
+def _delete_obsolete(desired: Set[str], name_to_did: Dict[str, int]) -> None:
+    obsolete_ids = [
+        did
+        for name, did in name_to_did.items()
+        if name.startswith(PRACTICE_PREFIX) and name not in desired
+    ]
+    if not obsolete_ids:
+        return
+    if hasattr(mw.col.decks, "remove"):
+        mw.col.decks.remove(obsolete_ids)
+    else:
+        for did in obsolete_ids:
             mw.col.decks.rem(did)
 
 
 def build_all_filtered_decks() -> None:
+    from aqt.qt import QMessageBox
+
     root = _ensure_repo_path()
     specs = _load_specs(root)
     desired = {s["deck"] for s in specs}
 
     errors: List[str] = []
+    # deck name -> id, snapshotted once per run
+    name_to_did = _deck_ids()
+    # did -> deck name, rebuilt once all configs are saved
+    to_rebuild: Dict[int, str] = {}
 
     for spec in specs:
         try:
-            _create_or_update_filtered_deck(spec)
+            to_rebuild[_create_or_update_filtered_deck(spec, name_to_did)] = str(spec["deck"])
         except Exception as e:
             errors.append(f"{spec.get('deck')}: {e}")
 
+    # IMPORTANT: force rebuild synchronously
+    for did, deck_name in to_rebuild.items():
+        try:
+            _rebuild_filtered_deck(did)
+        except Exception as e:
+            errors.append(f"{deck_name}: {e}")
+
     try:
-        _delete_obsolete(desired)
+        _delete_obsolete(desired, name_to_did)
     except Exception as e:
         errors.append(f"delete obsolete: {e}")
 
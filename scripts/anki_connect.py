@@ -3,9 +3,24 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
+import http.client
 import json
-import urllib.request
+import select
+
+try:
+    import orjson
+except ImportError:  # stdlib fallback, orjson is optional
+    orjson = None
+
+
+ANKI_CONNECT_HOST = "127.0.0.1"
+ANKI_CONNECT_PORT = 8765
+
+# Kept between invoke() calls only while the server explicitly answers with
+# "Connection: keep-alive"; AnkiConnect's built-in server closes after every
+# response, so by default each call opens its own connection.
+_connection: Optional[http.client.HTTPConnection] = None
 
 
 @dataclass(frozen=True)
@@ -18,6 +33,58 @@ class AnkiConnectError(Exception):
         return self.message
 
 
+def json_dumps(obj: Any, *, indent: bool = False) -> bytes:
+    """Serialize `obj` to UTF-8 JSON bytes (orjson if installed, else stdlib)."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+    return json.dumps(obj, ensure_ascii=False, indent=2 if indent else None).encode("utf-8")
+
+
+def json_loads(data: bytes) -> Any:
+    """Parse UTF-8 JSON bytes (orjson if installed, else stdlib)."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _server_closed(conn: http.client.HTTPConnection) -> bool:
+    """Return True if the server has closed an idle connection (its socket reads as ready)."""
+    if conn.sock is None:
+        return False
+    readable, _, _ = select.select([conn.sock], [], [], 0)
+    return bool(readable)
+
+
+def _post(data: bytes) -> bytes:
+    """POST a JSON body to AnkiConnect and return the raw response body.
+
+    A connection is only reused if the previous response explicitly asked for
+    keep-alive, and an idle one the server closed meanwhile is replaced before
+    anything is sent. A request is never re-sent, since actions such as
+    addNotes or multi are not safe to repeat.
+    """
+    global _connection
+    if _connection is not None and _server_closed(_connection):
+        _connection.close()
+        _connection = None
+    conn = _connection or http.client.HTTPConnection(ANKI_CONNECT_HOST, ANKI_CONNECT_PORT, timeout=30)
+    _connection = None
+    try:
+        conn.request("POST", "/", body=data, headers={"Content-Type": "application/json"})
+        resp = conn.getresponse()
+        body = resp.read()
+    except (OSError, http.client.HTTPException):
+        conn.close()
+        raise
+    if not resp.will_close and resp.getheader("Connection", "").lower() == "keep-alive":
+        _connection = conn
+    else:
+        conn.close()
+    if resp.status != 200:
+        raise AnkiConnectError(f"AnkiConnect returned HTTP {resp.status}")
+    return body
+
+
 def invoke(action: str, params: Optional[Dict[str, Any]] = None, *, version: int = 6) -> Any:
     """Invoke an AnkiConnect action and return the result.
 
@@ -31,18 +98,40 @@ def invoke(action: str, params: Optional[Dict[str, Any]] = None, *, version: int
 
     Raises:
         AnkiConnectError: If AnkiConnect returns a non-null error.
-        URLError: If AnkiConnect is unreachable.
+        OSError: If AnkiConnect is unreachable.
+        http.client.HTTPException: If AnkiConnect sends a malformed or truncated response.
         ValueError: If response is not valid JSON.
     """
     payload: Dict[str, Any] = {"action": action, "version": version}
     if params is not None:
         payload["params"] = params
 
-    data = json.dumps(payload).encode("utf-8")
-    req = urllib.request.Request("http://127.0.0.1:8765", data=data, headers={"Content-Type": "application/json"})
-    with urllib.request.urlopen(req, timeout=30) as resp:
-        raw = resp.read().decode("utf-8")
-    parsed = json.loads(raw)
+    parsed = json_loads(_post(json_dumps(payload)))
     if parsed.get("error") is not None:
         raise AnkiConnectError(str(parsed["error"]))
     return parsed.get("result")
+
+
+def invoke_multi(actions: List[Dict[str, Any]], *, version: int = 6) -> List[Any]:
+    """Invoke several AnkiConnect actions in a single `multi` request.
+
+    Args:
+        actions: Items of the form `{"action": ..., "params": {...}}`.
+        version: AnkiConnect API version used for every action.
+
+    Returns:
+        The `result` of each action, in order.
+
+    Raises:
+        AnkiConnectError: If the request or any of the actions fails.
+    """
+    if not actions:
+        return []
+    batch = [{**a, "version": version} for a in actions]
+    replies = invoke("multi", {"actions": batch}, version=version)
+    results: List[Any] = []
+    for a, reply in zip(actions, replies):
+        if reply.get("error") is not None:
+            raise AnkiConnectError(f"{a['action']}: {reply['error']}")
+        results.append(reply.get("result"))
+    return results
@@ -12,20 +12,17 @@ This script:
 
 from __future__ import annotations
 
-import json
 import re
 from dataclasses import dataclass
 from pathlib import Path
-from typing import List
+from typing import Any, Dict, List
 
-from anki_connect import invoke
+from anki_connect import invoke, invoke_multi, json_dumps, json_loads
 
 
 PRACTICE_INFO_DECK = "Italiano::Practice::Info"
 PRACTICE_MODEL = "Italiano::PracticeDescription"
-
-def _ensure_deck(deck_name:str) -> None:
-    invoke('createDeck', {'deck': deck_name})
+PRACTICE_INFO_TAG = "practice::info"
 
 
 @dataclass(frozen=True)
@@ -76,7 +73,7 @@ def _load_practices(root: Path) -> List[Practice]:
     """Load all practice JSON files."""
     practices: List[Practice] = []
     for p in sorted((root / "practices").glob("*.json")):
-        data = json.loads(p.read_text(encoding="utf-8"))
+        data = json_loads(p.read_bytes())
         practices.append(
             Practice(
                 name=str(data["name"]),
@@ -91,35 +88,51 @@ def _load_practices(root: Path) -> List[Practice]:
     return practices
 
 
-def _upsert_practice_info_note(p: Practice) -> None:
-    """Create or update a practice description note in PRACTICE_INFO_DECK."""
-    _ensure_deck(PRACTICE_INFO_DECK)
-    note_id = f"practice:{_slug(p.name)}"
-    query = f'deck:"{PRACTICE_INFO_DECK}" "{note_id}"'
-    existing = invoke("findNotes", {"query": query})
+def _upsert_practice_info_notes(practices: List[Practice]) -> None:
+    """Create or update one practice description note per practice in PRACTICE_INFO_DECK.
 
-    fields = {
-        "NoteID": note_id,
-        "Name": p.name,
-        "Search": p.search,
-        "Description": p.description,
-    }
+    All existing info notes are looked up once, then new notes are added with a
+    single addNotes call and updates are sent as a single multi request.
+    """
+    _, existing_ids = invoke_multi(
+        [
+            {"action": "createDeck", "params": {"deck": PRACTICE_INFO_DECK}},
+            {"action": "findNotes", "params": {"query": f'deck:"{PRACTICE_INFO_DECK}" tag:{PRACTICE_INFO_TAG}'}},
+        ]
+    )
 
-    if existing:
-        invoke("updateNoteFields", {"note": {"id": int(existing[0]), "fields": fields}})
-        return
+    existing: Dict[str, int] = {}
+    if existing_ids:
+        for info in invoke("notesInfo", {"notes": existing_ids}):
+            note_id = (info.get("fields") or {}).get("NoteID", {}).get("value", "")
+            existing[note_id] = int(info["noteId"])
 
-    invoke(
-        "addNote",
-        {
-            "note": {
+    # Keyed by NoteID: practices whose names slugify to the same NoteID share one
+    # note, and the last of them wins.
+    to_add: Dict[str, Dict[str, Any]] = {}
+    updates: Dict[str, Dict[str, Any]] = {}
+    for p in practices:
+        note_id = f"practice:{_slug(p.name)}"
+        fields = {
+            "NoteID": note_id,
+            "Name": p.name,
+            "Search": p.search,
+            "Description": p.description,
+        }
+
+        if note_id in existing:
+            updates[note_id] = {"action": "updateNoteFields", "params": {"note": {"id": existing[note_id], "fields": fields}}}
+        else:
+            to_add[note_id] = {
                 "deckName": PRACTICE_INFO_DECK,
                 "modelName": PRACTICE_MODEL,
                 "fields": fields,
-                "tags": ["managed::italiano_repo", "practice::info"],
+                "tags": ["managed::italiano_repo", PRACTICE_INFO_TAG],
             }
-        },
-    )
+
+    invoke_multi(list(updates.values()))
+    if to_add:
+        invoke("addNotes", {"notes": list(to_add.values())})
 
 
 def export_filtered_deck_specs(root: Path, practices: List[Practice]) -> Path:
@@ -140,7 +153,7 @@ def export_filtered_deck_specs(root: Path, practices: List[Practice]) -> Path:
         }
         for p in practices
     ]
-    out_path.write_text(json.dumps(specs, ensure_ascii=False, indent=2), encoding="utf-8")
+    out_path.write_bytes(json_dumps(specs, indent=True))
     return out_path
 
 
@@ -149,8 +162,8 @@ def build_all(root: Path) -> None:
     _ensure_practice_model()
     practices = _load_practices(root)
 
+    _upsert_practice_info_notes(practices)
     for p in practices:
-        _upsert_practice_info_note(p)
         print(f"Upserted practice info note: {p.name}")
 
     out_path = export_filtered_deck_specs(root, practices)
@@ -4,32 +4,49 @@ from __future__ import annotations
 
 import csv
 import datetime as _dt
+import hashlib
+import itertools
+import json
+import os
+import shutil
+import tempfile
 import uuid
-from pathlib import Path
-from typing import Dict, List, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache, partial
+from pathlib import Path, PurePosixPath
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
 
 
 DEFAULT_DECK = "Italiano"
 DEFAULT_NOTE_TYPE = "Italiano::Cloze"
 MANAGED_TAG = "managed::italiano_repo"
-
-
-def _is_empty(value: str) -> bool:
-    """Return True if a CSV cell should be treated as empty."""
-    return value.strip() == ""
+LEVEL_TO_DIFFICULTY = {
+    "A1": "1",
+    "A2": "2",
+    "B1": "3",
+    "B2": "4",
+    "C1": "5",
+    "C2": "6",
+}
+NOTE_ID_BATCH = 256
+# Write buffer for the rewritten CSV; large enough that typical files are flushed in one write
+WRITE_BUFFER_SIZE = 1 << 20
+# Relative to the repo root; {"version": <sha1 of this script>, "files": {CSV path: [mtime_ns, size, sha1]}}
+# as of the last run. A cache written by a different version of the fill rules is discarded.
+FILL_CACHE = Path("build") / ".fill_cache.json"
+
+
+def _new_note_ids() -> Iterator[str]:
+    """Yield random (version 4) UUID strings, reading NOTE_ID_BATCH ids worth of entropy at once."""
+    while True:
+        blob = os.urandom(16 * NOTE_ID_BATCH)
+        for i in range(0, len(blob), 16):
+            yield str(uuid.UUID(bytes=blob[i : i + 16], version=4))
 
 
 def _difficulty_from_level(level: str) -> str:
     """Return a default difficulty number for a CEFR level string."""
-    mapping = {
-        "A1": "1",
-        "A2": "2",
-        "B1": "3",
-        "B2": "4",
-        "C1": "5",
-        "C2": "6",
-    }
-    return mapping.get(level.strip().upper(), "")
+    return LEVEL_TO_DIFFICULTY.get(level.strip().upper(), "")
 
 
 def _ensure_columns(header: List[str], required: List[str]) -> Tuple[List[str], Dict[str, int], bool]:
@@ -51,31 +68,32 @@ def _row_pad(row: List[str], width: int) -> None:
         row.extend([""] * (width - len(row)))
 
 
-def _derive_sourcefile(csv_path: Path, notes_dir: Path, row: List[str], idx: Dict[str, int]) -> str:
-    """Derive SourceFile from row or from filesystem path."""
-    if "SourceFile" in idx:
-        v = row[idx["SourceFile"]]
-        if not _is_empty(v):
-            return v.strip()
-
-    # Fallback: relative path under notes/ (posix style)
-    rel = csv_path.relative_to(notes_dir).as_posix()
-    # Mirror earlier convention: top folder + filename
-    return rel
-
+def _folder_stem(sourcefile: str) -> Tuple[str, str]:
+    """Return (top folder, file stem) of a SourceFile path, like Path.parts[0] / Path.stem.
 
-def _managed_tags_for(sourcefile: str, level: str) -> List[str]:
-    """Compute machine-managed tags for a row."""
+    Plain relative paths are split as strings; anything PurePosixPath would
+    normalise (root, empty or "." segments, trailing "/") goes through it.
+    """
+    segments = sourcefile.split("/")
+    if "" in segments or "." in segments:
+        p = PurePosixPath(sourcefile)
+        return (p.parts[0] if p.parts else ""), p.stem
+    name = segments[-1]
+    dot = name.rfind(".")
+    stem = name[:dot] if 0 < dot < len(name) - 1 else name
+    return segments[0], stem
+
+
+@lru_cache(maxsize=1024)
+def _managed_tags_for(sourcefile: str, level: str) -> Tuple[str, ...]:
+    """Compute machine-managed tags for a row (cached: rows of a file mostly share them)."""
     sourcefile = sourcefile.strip()
     level = level.strip()
 
     folder = ""
     stem = ""
     if sourcefile:
-        p = Path(sourcefile)
-        if len(p.parts) > 0:
-            folder = p.parts[0]
-        stem = p.stem
+        folder, stem = _folder_stem(sourcefile)
 
     tags = [MANAGED_TAG]
     if folder:
@@ -84,10 +102,10 @@ def _managed_tags_for(sourcefile: str, level: str) -> List[str]:
         tags.append(f"file::{stem}")
     if level:
         tags.append(f"level::{level.upper()}")
-    return tags
+    return tuple(tags)
 
 
-def _merge_tags(existing: str, to_add: List[str]) -> str:
+def _merge_tags(existing: str, to_add: Sequence[str]) -> str:
     """Merge tags, preserving existing order and appending missing."""
     current = [t for t in existing.split() if t]
     have = set(current)
@@ -99,6 +117,183 @@ def _merge_tags(existing: str, to_add: List[str]) -> str:
     return " ".join(out)
 
 
+def _make_row_filler(width: int, idx: Dict[str, int], today: str, default_sourcefile: str) -> Callable[[List[str]], bool]:
+    """Build the row-filling function for one CSV header shape.
+
+    Column positions and which optional columns exist are resolved here, once
+    per file, so the returned function does no header lookups per row.
+    """
+    note_id_i = idx["NoteID"]
+    tags_i = idx["Tags"]
+    # Difficulty is guaranteed to exist whenever Level does
+    level_i = idx.get("Level")
+    difficulty_i = idx.get("Difficulty")
+    sourcefile_i = idx.get("SourceFile")
+    # Deck, NoteType, UpdatedAt: column index -> constant default
+    defaults = [
+        (idx["Deck"], DEFAULT_DECK),
+        (idx["NoteType"], DEFAULT_NOTE_TYPE),
+        (idx["UpdatedAt"], today),
+    ]
+    # Lazily pulls entropy only once the first empty NoteID shows up
+    new_ids = _new_note_ids()
+
+    # A cell counts as empty if it is "" or whitespace only; `not v or v.isspace()`
+    # is checked inline since it runs for every cell and allocates nothing.
+    def fill(r: List[str]) -> bool:
+        """Fill defaults for a single data row in-place; return True if it changed."""
+        changed = False
+        _row_pad(r, width)
+
+        # NoteID
+        v = r[note_id_i]
+        if not v or v.isspace():
+            r[note_id_i] = next(new_ids)
+            changed = True
+
+        for i, value in defaults:
+            v = r[i]
+            if not v or v.isspace():
+                r[i] = value
+                changed = True
+
+        # Difficulty
+        level_val = ""
+        if level_i is not None:
+            level_val = r[level_i].strip()
+            v = r[difficulty_i]
+            if (not v or v.isspace()) and level_val:
+                d = _difficulty_from_level(level_val)
+                if d:
+                    r[difficulty_i] = d
+                    changed = True
+
+        # SourceFile from the row, falling back to the path relative to notes/
+        sourcefile_val = default_sourcefile
+        sourcefile_empty = True
+        if sourcefile_i is not None:
+            v = r[sourcefile_i]
+            if v and not v.isspace():
+                sourcefile_val = v.strip()
+                sourcefile_empty = False
+
+        # Managed tags (only if we have enough info to derive them)
+        managed = _managed_tags_for(sourcefile_val, level_val)
+
+        existing_tags = r[tags_i]
+        merged = _merge_tags(existing_tags, managed)
+        if merged != existing_tags:
+            r[tags_i] = merged
+            changed = True
+
+        # If we derived SourceFile from path and the column exists but is empty, fill it too (nice for maintainability)
+        if sourcefile_i is not None and sourcefile_empty:
+            r[sourcefile_i] = sourcefile_val
+            changed = True
+
+        return changed
+
+    return fill
+
+
+def _is_cache_entry(entry: Any) -> bool:
+    """Return True if `entry` has the [mtime_ns, size, sha1] shape."""
+    return (
+        isinstance(entry, list)
+        and len(entry) == 3
+        and isinstance(entry[0], int)
+        and isinstance(entry[1], int)
+        and isinstance(entry[2], str)
+    )
+
+
+def _load_cache(cache_path: Path, version: str) -> Dict[str, List[Any]]:
+    """Load the fill cache entries.
+
+    A missing or unreadable file, or one written for a different `version`, is
+    treated as empty; malformed entries are dropped.
+    """
+    try:
+        data = json.loads(cache_path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(data, dict) or data.get("version") != version:
+        return {}
+    files = data.get("files")
+    if not isinstance(files, dict):
+        return {}
+    return {key: entry for key, entry in files.items() if _is_cache_entry(entry)}
+
+
+def _save_cache(cache_path: Path, version: str, files: Dict[str, List[Any]]) -> None:
+    """Write the fill cache atomically."""
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = cache_path.with_suffix(".tmp")
+    data = {"version": version, "files": files}
+    tmp_path.write_text(json.dumps(data, indent=2, sort_keys=True), encoding="utf-8")
+    os.replace(tmp_path, cache_path)
+
+
+def _sha1(path: Path) -> str:
+    """Return the hex SHA-1 of a file's contents."""
+    return hashlib.sha1(path.read_bytes()).hexdigest()
+
+
+def _process_one(csv_path: Path, notes_dir: Path, today: str) -> Optional[Path]:
+    """Fill defaults in a single CSV file; return its path if it was modified."""
+    with csv_path.open("r", newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return None
+
+        required_cols = ["NoteID", "Deck", "NoteType", "Tags", "UpdatedAt"]
+        # Optional but used for smarter defaults if present
+        # (we do NOT force-create Level/Difficulty/SourceFile unless asked)
+        header, idx, changed = _ensure_columns(header, required_cols)
+
+        # Difficulty if Level exists, added only once there is a data row: peek at
+        # the first row so the final schema is settled before streaming
+        first = next(reader, None)
+        if first is not None and "Level" in idx and "Difficulty" not in idx:
+            header, idx, _ = _ensure_columns(header, ["Difficulty"])
+            changed = True
+        rows = reader if first is None else itertools.chain([first], reader)
+
+        # Mirror earlier convention for SourceFile: path relative to notes/ (posix style)
+        fill = _make_row_filler(len(header), idx, today, csv_path.relative_to(notes_dir).as_posix())
+
+        # Rows are written to a temp file next to the CSV as they are processed,
+        # which replaces the original only if something changed.
+        tmp = tempfile.NamedTemporaryFile(
+            "w",
+            buffering=WRITE_BUFFER_SIZE,
+            newline="",
+            encoding="utf-8",
+            dir=csv_path.parent,
+            suffix=".tmp",
+            delete=False,
+        )
+        try:
+            with tmp:
+                writer = csv.writer(tmp)
+                writer.writerow(header)
+                for r in rows:
+                    changed |= fill(r)
+                    writer.writerow(r)
+        except BaseException:
+            os.unlink(tmp.name)
+            raise
+
+    if changed:
+        shutil.copymode(csv_path, tmp.name)
+        os.replace(tmp.name, csv_path)
+        return csv_path
+
+    os.unlink(tmp.name)
+    return None
+
+
 def fill_defaults(root: Path) -> List[Path]:
     """Fill missing NoteID and default values for all CSV files under root.
 
@@ -112,6 +307,9 @@ def fill_defaults(root: Path) -> List[Path]:
       - Difficulty: if empty and Level is present, fill via A1..C2 -> 1..6
       - Tags: appends managed tags (managed::italiano_repo, source::..., file::..., level::...)
 
+    Files left unchanged since the last run (same mtime and size, or same
+    content hash) are skipped; see FILL_CACHE.
+
     Args:
         root: Repository root folder.
 
@@ -127,88 +325,41 @@ def fill_defaults(root: Path) -> List[Path]:
 
     today = _dt.date.today().isoformat()
 
-    modified: List[Path] = []
-    for csv_path in notes_dir.rglob("*.csv"):
-        with csv_path.open("r", newline="", encoding="utf-8") as f:
-            reader = csv.reader(f)
-            rows = list(reader)
-
-        if not rows:
-            continue
-
-        header = rows[0]
-        required_cols = ["NoteID", "Deck", "NoteType", "Tags", "UpdatedAt"]
-        # Optional but used for smarter defaults if present
-        # (we do NOT force-create Level/Difficulty/SourceFile unless asked)
-        header, idx, header_changed = _ensure_columns(header, required_cols)
-
-        changed = header_changed
-
-        for r in rows[1:]:
-            _row_pad(r, len(header))
-
-            # NoteID
-            if _is_empty(r[idx["NoteID"]]):
-                r[idx["NoteID"]] = str(uuid.uuid4())
-                changed = True
-
-            # Deck
-            if _is_empty(r[idx["Deck"]]):
-                r[idx["Deck"]] = DEFAULT_DECK
-                changed = True
-
-            # NoteType
-            if _is_empty(r[idx["NoteType"]]):
-                r[idx["NoteType"]] = DEFAULT_NOTE_TYPE
-                changed = True
-
-            # UpdatedAt
-            if _is_empty(r[idx["UpdatedAt"]]):
-                r[idx["UpdatedAt"]] = today
-                changed = True
-
-            # Difficulty (only if Difficulty column exists OR we can add it based on Level existing in header)
-            # Your request: "Difficulty if Level exists"
-            if "Level" in idx:
-                if "Difficulty" not in idx:
-                    # Add Difficulty column if missing (because Level exists)
-                    header.append("Difficulty")
-                    idx = {name: i for i, name in enumerate(header)}
-                    # Pad all rows to new width
-                    for rr in rows[1:]:
-                        _row_pad(rr, len(header))
-                    changed = True
-
-                level = r[idx["Level"]].strip()
-                if _is_empty(r[idx["Difficulty"]]) and not _is_empty(level):
-                    d = _difficulty_from_level(level)
-                    if d:
-                        r[idx["Difficulty"]] = d
-                        changed = True
-
-            # Managed tags (only if we have enough info to derive them)
-            level_val = r[idx["Level"]].strip() if "Level" in idx else ""
-            sourcefile_val = _derive_sourcefile(csv_path, notes_dir, r, idx)
-            managed = _managed_tags_for(sourcefile_val, level_val)
-
-            existing_tags = r[idx["Tags"]]
-            merged = _merge_tags(existing_tags, managed)
-            if merged != existing_tags:
-                r[idx["Tags"]] = merged
-                changed = True
-
-            # If we derived SourceFile from path and the column exists but is empty, fill it too (nice for maintainability)
-            if "SourceFile" in idx and _is_empty(r[idx["SourceFile"]]):
-                r[idx["SourceFile"]] = sourcefile_val
-                changed = True
+    cache_path = root / FILL_CACHE
+    # Any edit to the fill rules (this file) invalidates the cache
+    version = _sha1(Path(__file__))
+    cache = _load_cache(cache_path, version)
+    new_cache: Dict[str, List[Any]] = {}
+
+    paths: List[Path] = []
+    for csv_path in sorted(notes_dir.rglob("*.csv")):
+        key = csv_path.relative_to(root).as_posix()
+        st = csv_path.stat()
+        entry = cache.get(key)
+        if entry and entry[:2] == [st.st_mtime_ns, st.st_size]:
+            new_cache[key] = entry
+        elif entry and entry[2] == _sha1(csv_path):
+            # touched (e.g. by git checkout) but content unchanged
+            new_cache[key] = [st.st_mtime_ns, st.st_size, entry[2]]
+        else:
+            paths.append(csv_path)
+
+    # Files are independent, so they are processed in parallel; with a single CPU
+    # or fewer files than CPUs, process startup costs more than the work itself.
+    process = partial(_process_one, notes_dir=notes_dir, today=today)
+    cpus = os.cpu_count() or 1
+    if cpus == 1 or len(paths) < cpus:
+        results = [process(p) for p in paths]
+    else:
+        with ProcessPoolExecutor() as ex:
+            results = list(ex.map(process, paths, chunksize=8))
 
-        if changed:
-            with csv_path.open("w", newline="", encoding="utf-8") as f:
-                writer = csv.writer(f)
-                writer.writerows(rows)
-            modified.append(csv_path)
+    for csv_path in paths:
+        st = csv_path.stat()
+        new_cache[csv_path.relative_to(root).as_posix()] = [st.st_mtime_ns, st.st_size, _sha1(csv_path)]
+    _save_cache(cache_path, version, new_cache)
 
-    return modified
+    return [p for p in results if p]
 
 
 def main() -> None:
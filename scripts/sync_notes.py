@@ -3,81 +3,104 @@
 from __future__ import annotations
 
 import csv
-import json
-from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
 
-from anki_connect import invoke
+from anki_connect import invoke, invoke_multi, json_dumps
 
 
 MANAGED_TAG = "managed::italiano_repo"
 MANUAL_TAG_PREFIX = "my::"
 NOTE_ID_FIELD = "NoteID"
-
-
-@dataclass(frozen=True)
-class CsvNote:
-    """A single note row from a CSV file."""
-
-    note_id: str
-    deck: str
-    model: str
-    fields: Dict[str, str]
-    tags: List[str]
-
-
-def _read_csv_notes(csv_path: Path) -> List[CsvNote]:
-    """Read a CSV file into a list of CsvNote objects."""
+NOTES_INFO_BATCH = 500
+CSV_READ_WORKERS = 8
+MODEL_FIELDS = [
+    NOTE_ID_FIELD,
+    "SentenceCloze",
+    "Answer",
+    "FullSentenceIT",
+    "TranslationEN",
+    "Extra",
+    "SourceFile",
+    "Level",
+    "Difficulty",
+    "UpdatedAt",
+]
+
+
+@dataclass
+class NoteColumns:
+    """CSV notes stored column-wise: index i of every list belongs to the same row."""
+
+    note_ids: List[str] = field(default_factory=list)
+    decks: List[str] = field(default_factory=list)
+    models: List[str] = field(default_factory=list)
+    tags: List[List[str]] = field(default_factory=list)
+    # Anki model fields other than NoteID, one column per field
+    field_cols: Dict[str, List[str]] = field(default_factory=lambda: {name: [] for name in MODEL_FIELDS[1:]})
+
+    def fields(self, i: int) -> Dict[str, str]:
+        """Return the Anki model fields of row i."""
+        out = {NOTE_ID_FIELD: self.note_ids[i]}
+        for name, col in self.field_cols.items():
+            out[name] = col[i]
+        return out
+
+    def extend(self, other: NoteColumns) -> None:
+        """Append all rows of `other`."""
+        self.note_ids.extend(other.note_ids)
+        self.decks.extend(other.decks)
+        self.models.extend(other.models)
+        self.tags.extend(other.tags)
+        for name, col in self.field_cols.items():
+            col.extend(other.field_cols[name])
+
+
+def _read_csv_notes(csv_path: Path) -> NoteColumns:
+    """Read a CSV file into column-wise note storage."""
+    notes = NoteColumns()
     with csv_path.open("r", newline="", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        if reader.fieldnames is None:
-            return []
-        notes: List[CsvNote] = []
-        for row in reader:
-            note_id = (row.get("NoteID") or "").strip()
-            deck = (row.get("Deck") or "Italiano").strip()
-            model = (row.get("NoteType") or "Italiano::Cloze").strip()
-            tags = (row.get("Tags") or "").split()
-
-            # fields for the Anki model: everything except meta columns
-            fields: Dict[str, str] = {
-                "NoteID": note_id,
-                "SentenceCloze": (row.get("SentenceCloze") or "").strip(),
-                "Answer": (row.get("Answer") or "").strip(),
-                "FullSentenceIT": (row.get("FullSentenceIT") or "").strip(),
-                "TranslationEN": (row.get("TranslationEN") or "").strip(),
-                "Extra": (row.get("Extra") or "").strip(),
-                "SourceFile": (row.get("SourceFile") or "").strip(),
-                "Level": (row.get("Level") or "").strip(),
-                "Difficulty": (row.get("Difficulty") or "").strip(),
-                "UpdatedAt": (row.get("UpdatedAt") or "").strip(),
-            }
-
-            notes.append(CsvNote(note_id=note_id, deck=deck, model=model, fields=fields, tags=tags))
-        return notes
-
-
-def _ensure_models() -> None:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return notes
+
+        # Column positions are resolved once; absent columns point at a padding cell
+        # that every row gets, so they read as "".
+        width = len(header)
+        idx = {name: i for i, name in enumerate(header)}
+        note_id_i = idx.get("NoteID", width)
+        deck_i = idx.get("Deck", width)
+        model_i = idx.get("NoteType", width)
+        tags_i = idx.get("Tags", width)
+        # fields for the Anki model: everything except meta columns
+        field_pos = [(col, idx.get(name, width)) for name, col in notes.field_cols.items()]
+
+        for r in reader:
+            if not r:
+                continue
+            del r[width:]
+            r.extend([""] * (width + 1 - len(r)))
+
+            notes.note_ids.append(r[note_id_i].strip())
+            notes.decks.append((r[deck_i] or "Italiano").strip())
+            notes.models.append((r[model_i] or "Italiano::Cloze").strip())
+            notes.tags.append(r[tags_i].split())
+            for col, i in field_pos:
+                col.append(r[i].strip())
+    return notes
+
+
+def _ensure_models(model_names: Iterable[str]) -> None:
     """Ensure the required models exist (minimal templates)."""
-    model_names = set(invoke("modelNames"))
-    if "Italiano::Cloze" not in model_names:
+    if "Italiano::Cloze" not in set(model_names):
         invoke(
             "createModel",
             {
                 "modelName": "Italiano::Cloze",
-                "inOrderFields": [
-                    "NoteID",
-                    "SentenceCloze",
-                    "Answer",
-                    "FullSentenceIT",
-                    "TranslationEN",
-                    "Extra",
-                    "SourceFile",
-                    "Level",
-                    "Difficulty",
-                    "UpdatedAt",
-                ],
+                "inOrderFields": MODEL_FIELDS,
                 "css": ".card { font-family: arial; font-size: 20px; text-align: left; }",
                 "isCloze": False,
                 "cardTemplates": [
@@ -91,15 +114,22 @@ def _ensure_models() -> None:
         )
 
 
-def _get_managed_notes() -> Dict[str, int]:
-    """Return mapping NoteID -> Anki note id for managed notes."""
-    note_ids = invoke("findNotes", {"query": f"tag:{MANAGED_TAG}"})
+def _iter_notes_info(note_ids: List[int]) -> Iterator[Dict[str, Any]]:
+    """Yield notesInfo entries, fetching at most NOTES_INFO_BATCH notes per request.
+
+    Only one batch of the (potentially large) response is held in memory at a time.
+    """
+    for start in range(0, len(note_ids), NOTES_INFO_BATCH):
+        yield from invoke("notesInfo", {"notes": note_ids[start : start + NOTES_INFO_BATCH]})
+
+
+def _get_managed_notes(note_ids: List[int]) -> Dict[str, int]:
+    """Return mapping NoteID -> Anki note id for the given managed notes."""
     if not note_ids:
         return {}
 
-    info = invoke("notesInfo", {"notes": note_ids})
     mapping: Dict[str, int] = {}
-    for n in info:
+    for n in _iter_notes_info(note_ids):
         fields = n.get("fields") or {}
         noteid_field = fields.get(NOTE_ID_FIELD, {}).get("value", "")
         noteid_field = (noteid_field or "").strip()
@@ -114,13 +144,47 @@ def _split_tags(tags: List[str]) -> Tuple[List[str], List[str]]:
     non_manual = [t for t in tags if not t.startswith(MANUAL_TAG_PREFIX)]
     return manual, non_manual
 
+
+def _tag_delta(current_tags: List[str], csv_tags: List[str]) -> Tuple[Tuple[str, ...], Tuple[str, ...]]:
+    """Return sorted (tags to remove, tags to add) that turn a note's tags into its CSV tags.
+
+    Manual tags already on the note are preserved, as are manual tags in the CSV.
+    """
+    current_manual, _ = _split_tags(current_tags)
+
+    csv_manual, csv_non_manual = _split_tags(csv_tags)
+    # preserve current manual tags + any manual tags in CSV
+    merged_manual = list(dict.fromkeys(current_manual + csv_manual))
+    merged_non_manual = list(dict.fromkeys([MANAGED_TAG] + csv_non_manual))
+
+    target_tags = list(dict.fromkeys(merged_non_manual + merged_manual))
+
+    # Compute tag delta (AnkiConnect has no set/replace action for tags).
+    current = set(current_tags)
+    target = set(target_tags)
+
+    to_remove = tuple(sorted(t for t in (current - target) if not t.startswith(MANUAL_TAG_PREFIX)))
+    to_add = tuple(sorted(target - current))
+    return to_remove, to_add
+
+
 def sync_repo(root: Path) -> None:
     """Sync all CSV notes under notes/ into Anki."""
-    _ensure_models()
-
-    csv_notes: List[CsvNote] = []
-    for csv_path in (root / "notes").rglob("*.csv"):
-        csv_notes.extend(_read_csv_notes(csv_path))
+    model_names, managed_note_ids = invoke_multi(
+        [
+            {"action": "modelNames"},
+            {"action": "findNotes", "params": {"query": f"tag:{MANAGED_TAG}"}},
+        ]
+    )
+    _ensure_models(model_names)
+
+    csv_paths = list((root / "notes").rglob("*.csv"))
+    notes = NoteColumns()
+    # CSVs are read concurrently; results are merged in path order.
+    with ThreadPoolExecutor(max_workers=CSV_READ_WORKERS) as ex:
+        parts = list(ex.map(_read_csv_notes, csv_paths))
+    for csv_path, part in zip(csv_paths, parts):
+        notes.extend(part)
         print(csv_path)
 
         fl = csv_path.stem
@@ -129,8 +193,8 @@ def sync_repo(root: Path) -> None:
 
         if not required_fl.exists():
             required_fl.parent.mkdir(parents=True, exist_ok=True)
-            with required_fl.open("w", encoding="utf-8") as f:
-                json.dump(
+            required_fl.write_bytes(
+                json_dumps(
                     {
                         "name": fl.replace("_", " "),
                         "deck": f"Italiano::Practice::{fl}",
@@ -140,64 +204,61 @@ def sync_repo(root: Path) -> None:
                         "reschedule": True,
                         "description": "Practice all cards from this specific CSV file.",
                     },
-                    f,
-                    ensure_ascii=False,
-                    indent=2,
+                    indent=True,
                 )
+            )
 
-    # Build desired NoteID set
-    desired_by_id: Dict[str, CsvNote] = {n.note_id: n for n in csv_notes if n.note_id}
+    # Build desired NoteID set (NoteID -> row index)
+    desired_by_id: Dict[str, int] = {note_id: i for i, note_id in enumerate(notes.note_ids) if note_id}
 
-    existing = _get_managed_notes()
+    existing = _get_managed_notes(managed_note_ids)
 
-    to_add = [n for n in csv_notes if n.note_id and n.note_id not in existing]
-    to_update = [n for n in csv_notes if n.note_id and n.note_id in existing]
-    to_delete_note_ids = [anki_id for noteid, anki_id in existing.items() if noteid not in desired_by_id]
+    # Partition the two NoteID key sets; row indices are sorted to keep CSV order.
+    to_add = sorted(desired_by_id[k] for k in desired_by_id.keys() - existing.keys())
+    to_update = sorted(desired_by_id[k] for k in desired_by_id.keys() & existing.keys())
+    to_delete_note_ids = [existing[k] for k in existing.keys() - desired_by_id.keys()]
 
     # Add new notes
     if to_add:
         payload_notes = []
-        for n in to_add:
-            manual, non_manual = _split_tags(n.tags)
+        for i in to_add:
+            manual, non_manual = _split_tags(notes.tags[i])
             tags = list(dict.fromkeys([MANAGED_TAG] + non_manual + manual))
-            payload_notes.append({"deckName": n.deck, "modelName": n.model, "fields": n.fields, "tags": tags})
+            payload_notes.append(
+                {"deckName": notes.decks[i], "modelName": notes.models[i], "fields": notes.fields(i), "tags": tags}
+            )
         invoke("addNotes", {"notes": payload_notes})
         print(f"Added: {len(to_add)}")
 
     # Update existing notes (fields + managed tags; keep manual tags)
     if to_update:
         # Fetch current tags so we can preserve manual tags even if CSV doesn't include them
-        anki_ids = [existing[n.note_id] for n in to_update]
-        infos = invoke("notesInfo", {"notes": anki_ids})
-        current_tags_by_anki_id: Dict[int, List[str]] = {int(i["noteId"]): list(i.get("tags") or []) for i in infos}
-
-        for n in to_update:
-            anki_id = existing[n.note_id]
-            invoke("updateNoteFields", {"note": {"id": anki_id, "fields": n.fields}})
-
-            current_tags = current_tags_by_anki_id.get(anki_id, [])
-            current_manual, _ = _split_tags(current_tags)
-
-            csv_manual, csv_non_manual = _split_tags(n.tags)
-            # preserve current manual tags + any manual tags in CSV
-            merged_manual = list(dict.fromkeys(current_manual + csv_manual))
-            merged_non_manual = list(dict.fromkeys([MANAGED_TAG] + csv_non_manual))
-
-            target_tags = list(dict.fromkeys(merged_non_manual + merged_manual))
-
-            # Set tags (replace entirely) to avoid drift
-            #invoke("setNoteTags", {"notes": [anki_id], "tags": " ".join(target_tags)})
-            # Compute tag delta and apply via AnkiConnect (no set/replace action exists).
-            current = set(current_tags)
-            target = set(target_tags)
-
-            to_remove = sorted(t for t in (current - target) if not t.startswith(MANUAL_TAG_PREFIX))
-            to_add = sorted(target - current)
-
+        anki_ids = [existing[notes.note_ids[i]] for i in to_update]
+        current_tags_by_anki_id: Dict[int, List[str]] = {
+            int(i["noteId"]): list(i.get("tags") or []) for i in _iter_notes_info(anki_ids)
+        }
+
+        # Queue everything and send it as one `multi` request; tag deltas shared by
+        # several notes are grouped into a single add/remove action.
+        actions: List[Dict[str, Any]] = []
+        remove_groups: Dict[Tuple[str, ...], List[int]] = {}
+        add_groups: Dict[Tuple[str, ...], List[int]] = {}
+
+        for i in to_update:
+            anki_id = existing[notes.note_ids[i]]
+            actions.append({"action": "updateNoteFields", "params": {"note": {"id": anki_id, "fields": notes.fields(i)}}})
+
+            to_remove, tags_to_add = _tag_delta(current_tags_by_anki_id.get(anki_id, []), notes.tags[i])
             if to_remove:
-                invoke("removeTags", {"notes": [anki_id], "tags": " ".join(to_remove)})
-            if to_add:
-                invoke("addTags", {"notes": [anki_id], "tags": " ".join(to_add)})
+                remove_groups.setdefault(to_remove, []).append(anki_id)
+            if tags_to_add:
+                add_groups.setdefault(tags_to_add, []).append(anki_id)
+
+        for tags, ids in remove_groups.items():
+            actions.append({"action": "removeTags", "params": {"notes": ids, "tags": " ".join(tags)}})
+        for tags, ids in add_groups.items():
+            actions.append({"action": "addTags", "params": {"notes": ids, "tags": " ".join(tags)}})
+        invoke_multi(actions)
 
         print(f"Updated: {len(to_update)}")
 